@@ -4,6 +4,7 @@ import random
 import json
 import os
 
+import snapshot
 import utils
 
 # Init
@@ -74,6 +75,10 @@ class Game:
                     a.append(Platform((rect[0], rect[1]), (rect[2], rect[3]), rect[4]))
                 self.levels.append(a)
         self.level = random.choice(self.levels)
+        self.level_ids = {id(level): i for i, level in enumerate(self.levels)} # Level index lookup for snapshots
+
+        # Per-tick snapshots of the last 5 seconds for rewinding
+        self.history = snapshot.SnapshotBuffer(5*self.framerate)
 
         # Load settings
         if self.sett_file:
@@ -128,6 +133,10 @@ class Game:
                     self.vel_y = 12
                     if self.sfx_on: self.sfx['jump'].play()
 
+                # ... and [R] pressed and game started, go back one second (also works right after falling into lava)
+                if e.key == pg.K_r and self.game_started and not self.paused:
+                    self.rewind()
+
                 # pause
                 if e.key == pg.K_ESCAPE:
                     if self.paused:
@@ -191,6 +200,7 @@ class Game:
                         self.score = 0
                         self.dir = 0
                         self.pos = [self.win_size[0]//2, self.win_size[1]-260]
+                        self.history.clear()
                         self.sfx['music'].stop()
 
                     if pg.Rect(bx, 480, 192, 60).collidepoint(mpos):
@@ -213,6 +223,7 @@ class Game:
                 self.counter = 2147483647
                 self.pos = [self.win_size[0]//2, self.win_size[1]-260]
                 self.level = random.choice(self.levels)
+                self.history.clear()
         
         # if player not ded
         elif not self.paused:
@@ -320,11 +331,12 @@ class Game:
                     self.sfx['music'].stop()
                     self.dir = 0
                     self.dead = True
-                    self.counter = 30
+                    self.counter = 2*self.framerate # time left to rewind
                     self.score = 0
 
             if self.game_started:
                 self.timer += 1
+                if not self.dead: self.history.push(self)
             
         for p in self.particles:
             if p.passed_time > p.dur:
@@ -518,6 +530,38 @@ class Game:
         # Refresh
         pg.display.flip()
 
+    def snapshot(self, particles: bool = True) -> bytes:
+        # Pack the whole simulation state into a fixed-size record (checkpoints, save states)
+        return snapshot.snapshot(self, particles)
+
+    def restore(self, data: bytes):
+        # Restore a record made by `snapshot`, particles included if it has them
+        was_playing, was_paused = self.game_started and not self.dead, self.paused
+        snapshot.restore(self, data, Particle if len(data) == snapshot.record_size(True) else None)
+        self.sync_audio(was_playing, was_paused)
+
+    def rewind(self, ticks: int = None) -> bool:
+        # Go back `ticks` ticks in the history, one second by default (1 tick before death is still falling into lava)
+        if ticks is None: ticks = self.framerate
+        was_playing, was_paused = self.game_started and not self.dead, self.paused
+        if not self.history.rewind(self, ticks, Particle):
+            return False
+        self.sync_audio(was_playing, was_paused)
+        return True
+
+    def sync_audio(self, was_playing: bool, was_paused: bool):
+        # Start/stop the music and (un)pause the mixer after the state was replaced by a snapshot
+        playing = self.game_started and not self.dead
+        if playing and not was_playing:
+            if self.music_on: self.sfx['music'].play(-1)
+        elif was_playing and not playing:
+            self.sfx['music'].stop()
+
+        if self.paused:
+            pg.mixer.pause()
+        elif was_paused:
+            pg.mixer.unpause()
+
     def load_resources(self):
         # Load graphics
         gfx_path = os.path.abspath('./res/gfx/')
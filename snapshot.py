@@ -0,0 +1,169 @@
+"""
+Fixed-size binary snapshots of the game simulation state and a ring buffer to rewind through them.
+
+The global `random` state is not part of a record, so levels picked after a restore (when changing
+screens or after dying) can differ from the original run. Save `random.getstate()` next to a
+snapshot if a run has to be reproduced exactly.
+"""
+
+import struct
+
+
+# Simulation state: x, y, vel_y, dir, screen, level index, flags, score, timer, counter
+STATE = struct.Struct('<dddbbBBiii')
+# Particle: x, y, vel_x, vel_y, screen, duration, passed time, texture x, texture y
+PARTICLE = struct.Struct('<ddddbHHHH')
+PARTICLE_COUNT = struct.Struct('<B')
+MAX_PARTICLES = 64
+
+PARTICLE_BLOCK = PARTICLE_COUNT.size + MAX_PARTICLES*PARTICLE.size
+
+# Bits of the flags byte
+STARTED = 0b0001
+CAN_JUMP = 0b0010
+PAUSED = 0b0100
+DEAD = 0b1000
+
+
+def record_size(particles: bool = True) -> int:
+    return STATE.size + (PARTICLE_BLOCK if particles else 0)
+
+
+def pack_into(buf: bytearray, offset: int, game, particles: bool = True):
+    """
+    Writes the simulation state of `game` into `buf` at `offset`.
+    The level is stored as its index in `game.levels`, and (if `particles`) the newest
+    `MAX_PARTICLES` particles are appended as a fixed-size block.
+    """
+
+    flags = (STARTED*game.game_started) | (CAN_JUMP*game.can_jump) | (PAUSED*game.paused) | (DEAD*game.dead)
+    STATE.pack_into(buf, offset,
+                    game.pos[0], game.pos[1], game.vel_y, game.dir, game.screen,
+                    game.level_ids[id(game.level)], flags, game.score, game.timer, game.counter)
+
+    if particles:
+        offset += STATE.size
+        ps = game.particles[-MAX_PARTICLES:]
+        PARTICLE_COUNT.pack_into(buf, offset, len(ps))
+        offset += PARTICLE_COUNT.size
+        for p in ps:
+            PARTICLE.pack_into(buf, offset,
+                               p.pos[0], p.pos[1], p.vel[0], p.vel[1], p.screen,
+                               p.dur, p.passed_time, p.tex_pos[0], p.tex_pos[1])
+            offset += PARTICLE.size
+
+
+def unpack_from(buf, offset: int, game, particle_cls=None):
+    """
+    Restores the state written by `pack_into` back onto `game`.
+    Particles are only rebuilt when `particle_cls` is given, otherwise they are left untouched.
+    """
+
+    x, y, vel_y, dir, screen, level, flags, score, timer, counter = STATE.unpack_from(buf, offset)
+    game.pos = [x, y]
+    game.vel_y = vel_y
+    game.dir = dir
+    game.screen = screen
+    game.level = game.levels[level]
+    game.game_started = bool(flags & STARTED)
+    game.can_jump = bool(flags & CAN_JUMP)
+    game.paused = bool(flags & PAUSED)
+    game.dead = bool(flags & DEAD)
+    game.score = score
+    game.timer = timer
+    game.counter = counter
+
+    if particle_cls is not None:
+        offset += STATE.size
+        count, = PARTICLE_COUNT.unpack_from(buf, offset)
+        offset += PARTICLE_COUNT.size
+        game.particles = []
+        for _ in range(count):
+            px, py, vx, vy, pscreen, dur, passed_time, tx, ty = PARTICLE.unpack_from(buf, offset)
+            # Skip __init__ so the random texture position doesn't touch the global RNG
+            p = particle_cls.__new__(particle_cls)
+            p.pos = [px, py]
+            p.vel = [vx, vy]
+            p.screen = pscreen
+            p.dur = dur
+            p.passed_time = passed_time
+            p.tex_pos = (tx, ty)
+            p.wh = game.win_size[1]
+            game.particles.append(p)
+            offset += PARTICLE.size
+
+
+# Ring buffer of the last `capacity` snapshots, allocated once up front
+class SnapshotBuffer:
+    def __init__(self, capacity: int, particles: bool = False):
+        if capacity < 1:
+            raise ValueError('Capacity must be at least 1')
+
+        self.capacity = capacity
+        self.particles = particles
+        self.size = record_size(particles)
+        self.buf = bytearray(capacity*self.size)
+        self.head = 0 # Slot the next snapshot goes into
+        self.count = 0
+
+    def __len__(self):
+        return self.count
+
+    def clear(self):
+        self.head = 0
+        self.count = 0
+
+    def push(self, game):
+        pack_into(self.buf, self.head*self.size, game, self.particles)
+        self.head = (self.head + 1) % self.capacity
+        if self.count < self.capacity:
+            self.count += 1
+
+    def rewind(self, game, ticks: int = 1, particle_cls=None) -> bool:
+        """
+        Restores the snapshot taken `ticks` pushes ago (1 = the latest one) and drops everything newer,
+        so recording can continue from there. Rewinds as far as possible if `ticks` exceeds the history.
+        Returns False if the buffer is empty.
+        """
+
+        if self.count == 0:
+            return False
+
+        ticks = max(1, min(ticks, self.count))
+        self.head = (self.head - ticks) % self.capacity
+        self.count -= ticks
+        unpack_from(self.buf, self.head*self.size, game, particle_cls if self.particles else None)
+        return True
+
+
+def snapshot(game, particles: bool = True) -> bytes:
+    buf = bytearray(record_size(particles))
+    pack_into(buf, 0, game, particles)
+    return bytes(buf)
+
+
+def restore(game, data: bytes, particle_cls=None):
+    if particle_cls is not None and len(data) < record_size(True):
+        raise ValueError('Snapshot has no particle block')
+    unpack_from(data, 0, game, particle_cls)
+
+
+if __name__ == "__main__":
+    # Measure the cost of a snapshot without needing a window
+    from types import SimpleNamespace
+    import timeit
+
+    levels = [[], []]
+    level_ids = {id(level): i for i, level in enumerate(levels)}
+    particle = SimpleNamespace(pos=[640.0, 580.0], vel=[1.5, -5.5], screen=1, dur=200, passed_time=12, tex_pos=(100, 200))
+    game = SimpleNamespace(pos=[640, 436.2], vel_y=-3.6, dir=1, screen=1, levels=levels, level_ids=level_ids, level=levels[1],
+                           game_started=True, can_jump=False, paused=False, dead=False,
+                           score=3, timer=1234, counter=-1234, particles=[particle]*7, win_size=(1280, 720))
+
+    n = 100000
+    for particles in [False, True]:
+        history = SnapshotBuffer(300, particles)
+        t = timeit.timeit(lambda: history.push(game), number=n)
+        print(f'push ({"with" if particles else "without"} particles, {history.size} B): {t/n*1e6:.2f} us')
+        t = timeit.timeit(lambda: (history.push(game), history.rewind(game)), number=n)
+        print(f'push + rewind ({"with" if particles else "without"} particles): {t/n*1e6:.2f} us')